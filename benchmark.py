@@ -1,72 +1,160 @@
 """
 Performance Benchmark / Load Test
 ====================================
-Spawns N concurrent threads each submitting M score updates.
+Spawns N concurrent threads each submitting M score updates over a pool of
+pre-warmed keep-alive TLS sockets (at most --pool connections are opened).
 Measures: throughput, avg latency, success rate, updates/sec.
 
-Usage:  python benchmark.py [--clients 20] [--updates 50]
+Usage:  python benchmark.py [--clients 20] [--updates 50] [--pool 32] [--binary]
+
+--binary sends UPDATEs as fixed-layout struct frames instead of JSON lines.
 """
 
-import socket, ssl, json, time, threading, argparse, statistics, random
+import socket, ssl, json, time, threading, argparse, statistics, random, queue, struct
+
+try:
+    import numpy as np
+except ImportError:                     # optional; only used to pre-draw scores
+    np = None
+
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps
+except ImportError:                     # stdlib fallback; same bytes-in/bytes-out contract
+    _loads = json.loads
+    _dumps = lambda obj: json.dumps(obj).encode()
 
 HOST = "127.0.0.1"; PORT = 9443
+POOL_CAP = 32
+RECV_SIZE = 65536
+
+# Must match server.BIN_UPDATE: cmd, player_id[16], score u32, name[32], ts i64 ns.
+BIN_UPDATE     = struct.Struct("<B16sI32sq")
+BIN_UPDATE_CMD = 0x01
+
+
+# One context for every worker socket; TLS 1.3 so reconnects can resume the session.
+_CTX = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+_CTX.check_hostname  = False
+_CTX.verify_mode     = ssl.CERT_NONE
+_CTX.minimum_version = ssl.TLSVersion.TLSv1_3
+_session = None     # last session ticket seen, offered on the next connect
 
 
 def make_tls_socket():
-    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-    ctx.check_hostname = False
-    ctx.verify_mode    = ssl.CERT_NONE
     raw  = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock = ctx.wrap_socket(raw, server_hostname=HOST)
+    raw.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)   # don't let Nagle hold small requests
+    sock = _CTX.wrap_socket(raw, server_hostname=HOST, session=_session)
     sock.connect((HOST, PORT))
     return sock
 
 
-def send_recv(sock, obj):
-    sock.sendall((json.dumps(obj) + "\n").encode())
-    buf = ""
-    while "\n" not in buf:
-        buf += sock.recv(4096).decode()
-    return json.loads(buf.split("\n")[0])
+def remember_session(sock):
+    """TLS 1.3 tickets arrive after the handshake, so grab them once traffic has flowed."""
+    global _session
+    if sock.session is not None:
+        _session = sock.session
+
+
+def make_pool(size):
+    """Open `size` keep-alive sockets up front; each handshake after the first resumes the session."""
+    pool, rbuf = queue.Queue(), bytearray(RECV_SIZE)
+    for _ in range(size):
+        sock = make_tls_socket()
+        send_recv(sock, {"cmd": "PING"}, rbuf)
+        remember_session(sock)
+        pool.put(sock)
+    return pool
+
+
+def send_recv(sock, obj, rbuf):
+    return send_frame_recv(sock, _dumps(obj) + b"\n", rbuf)
+
 
+def send_frame_recv(sock, frame, rbuf):
+    """One already-encoded request and its reply, read in place into the caller's reusable `rbuf`."""
+    sock.sendall(frame)
+    view, n = memoryview(rbuf), 0
+    while True:
+        got = sock.recv_into(view[n:])
+        if not got:
+            raise ConnectionError("Server closed connection" if n < len(rbuf) else "Reply exceeds RECV_SIZE")
+        end = rbuf.find(b"\n", n, n + got)
+        n  += got
+        if end != -1:
+            return _loads(rbuf[:end])
 
-def worker(pid, n_updates, results, barrier):
+
+def draw_scores(n, lo, hi):
+    """n random scores in [lo, hi], drawn up front so the timed loop does no RNG work."""
+    if np is not None:
+        return np.random.default_rng().integers(lo, hi, size=n, endpoint=True, dtype=np.int32).tolist()
+    return random.choices(range(lo, hi + 1), k=n)
+
+
+def worker(pid, n_updates, pool, results, barrier, binary=False):
     latencies, errors = [], 0
+    rbuf = bytearray(RECV_SIZE)
+    name = f"Bot-{pid}"
+    pid_b, name_b = pid.encode(), name.encode()
+    # Only score and ts change per UPDATE, so encode the rest once and format the tail.
+    prefix = b'{"cmd":"UPDATE","player_id":%s,"name":%s,"score":' % (_dumps(pid), _dumps(name))
+    scores = draw_scores(n_updates, 1, 100000)
+    barrier.wait()
+    # A pool slot holds a live socket, or None after a failed reconnect; either way
+    # it goes back when this worker is done, so the pool never shrinks and workers
+    # queued behind a small --pool always get their turn.
+    sock, attempted = pool.get(), 0
     try:
-        sock = make_tls_socket()
-        barrier.wait()
-        for _ in range(n_updates):
-            score = random.randint(1, 100000)
-            t0    = time.perf_counter()
+        if sock is None:
+            sock = make_tls_socket()
+        for score in scores:
+            attempted += 1
+            t0 = time.perf_counter()
             try:
-                resp = send_recv(sock, {"cmd": "UPDATE", "player_id": pid,
-                                         "name": f"Bot-{pid}", "score": score, "ts": time.time()})
+                if binary:
+                    frame = BIN_UPDATE.pack(BIN_UPDATE_CMD, pid_b, score, name_b, time.time_ns())
+                else:
+                    frame = prefix + b'%d,"ts":%d}\n' % (score, time.time_ns())
+                resp = send_frame_recv(sock, frame, rbuf)
                 latencies.append((time.perf_counter() - t0) * 1000)
                 if resp.get("status") != "ok":
                     errors += 1
             except Exception:
                 errors += 1
-        sock.close()
+                sock.close()                # don't hand a broken socket to the next worker
+                sock = None
+                sock = make_tls_socket()
     except Exception:
-        errors += n_updates
+        errors += n_updates - attempted     # only the updates that were never sent
+    finally:
+        pool.put(sock)
     results.append({"latencies": latencies, "errors": errors})
 
 
-def run_benchmark(n_clients, n_updates):
+def run_benchmark(n_clients, n_updates, pool_cap=POOL_CAP, binary=False):
+    pool_size = min(n_clients, pool_cap)
     print(f"\n{'='*55}")
     print(f"  BENCHMARK: {n_clients} clients × {n_updates} updates each")
+    print(f"  Pool      : {pool_size} keep-alive TLS connections")
+    print(f"  Wire      : {'binary struct' if binary else 'JSON'} UPDATE frames")
     print(f"{'='*55}")
 
+    pool = make_pool(pool_size)
     results, threads = [], []
     barrier = threading.Barrier(n_clients)
     t_start = time.perf_counter()
 
     for i in range(n_clients):
-        t = threading.Thread(target=worker, args=(f"bot_{i:04d}", n_updates, results, barrier))
+        t = threading.Thread(target=worker, args=(f"bot_{i:04d}", n_updates, pool, results, barrier, binary))
         t.start(); threads.append(t)
     for t in threads: t.join()
 
     t_total   = time.perf_counter() - t_start
+    while not pool.empty():
+        sock = pool.get()
+        if sock is not None:
+            sock.close()
     all_lat   = [l for r in results for l in r["latencies"]]
     total_ok  = len(all_lat)
     total_err = sum(r["errors"] for r in results)
@@ -86,5 +174,7 @@ if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--clients", type=int, default=10)
     ap.add_argument("--updates", type=int, default=20)
+    ap.add_argument("--pool",    type=int, default=POOL_CAP, help="max TLS connections to open")
+    ap.add_argument("--binary",  action="store_true", help="send UPDATEs as binary struct frames")
     args = ap.parse_args()
-    run_benchmark(args.clients, args.updates)
+    run_benchmark(args.clients, args.updates, args.pool, args.binary)
@@ -6,16 +6,25 @@ Interactive CLI client with SSL/TLS connection to the leaderboard server.
 
 import socket, ssl, json, time, threading
 
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps
+except ImportError:                     # stdlib fallback; same bytes-in/bytes-out contract
+    _loads = json.loads
+    _dumps = lambda obj: json.dumps(obj).encode()
+
 HOST     = "127.0.0.1"
 PORT     = 9443
 CERTFILE = "certs/server.crt"
+RECV_SIZE = 65536
 
 
 class LeaderboardClient:
     def __init__(self, host=HOST, port=PORT):
         self.host, self.port = host, port
         self._sock = None
-        self._buf  = ""
+        self._buf  = bytearray()
+        self._view = memoryview(bytearray(RECV_SIZE))   # reused for every recv_into
         self._lock = threading.Lock()
 
     def connect(self):
@@ -33,21 +42,22 @@ class LeaderboardClient:
 
     def _send_recv(self, obj):
         with self._lock:
-            self._sock.sendall((json.dumps(obj) + "\n").encode())
-            while "\n" not in self._buf:
-                chunk = self._sock.recv(4096).decode()
-                if not chunk:
+            self._sock.sendall(_dumps(obj) + b"\n")
+            while (end := self._buf.find(b"\n")) == -1:
+                n = self._sock.recv_into(self._view)
+                if not n:
                     raise ConnectionError("Server closed connection")
-                self._buf += chunk
-            line, self._buf = self._buf.split("\n", 1)
-            return json.loads(line)
+                self._buf += self._view[:n]
+            line = self._buf[:end]
+            del self._buf[:end + 1]
+            return _loads(line)
 
     def ping(self):
         return self._send_recv({"cmd": "PING"})
 
     def update_score(self, player_id, name, score):
         return self._send_recv({"cmd": "UPDATE", "player_id": player_id,
-                                 "name": name, "score": score, "ts": time.time()})
+                                 "name": name, "score": score, "ts": time.time_ns()})
 
     def get_top(self, n=10):
         return self._send_recv({"cmd": "GET_TOP", "n": n})
@@ -6,6 +6,13 @@ Simulates 10 players submitting scores concurrently, then prints final leaderboa
 
 import socket, ssl, json, time, threading, random
 
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps
+except ImportError:                     # stdlib fallback; same bytes-in/bytes-out contract
+    _loads = json.loads
+    _dumps = lambda obj: json.dumps(obj).encode()
+
 HOST = "127.0.0.1"; PORT = 9443
 
 PLAYERS = [("alice","Alice"),("bob","Bob"),("carol","Carol"),("dave","Dave"),
@@ -13,30 +20,40 @@ PLAYERS = [("alice","Alice"),("bob","Bob"),("carol","Carol"),("dave","Dave"),
            ("isha","Isha"),("jay","Jay")]
 
 
+CTX = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+CTX.check_hostname  = False
+CTX.verify_mode     = ssl.CERT_NONE
+CTX.minimum_version = ssl.TLSVersion.TLSv1_3
+_session = None     # last TLS 1.3 ticket; lets later connects resume instead of full handshake
+
+
 def make_client():
-    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-    ctx.check_hostname = False
-    ctx.verify_mode    = ssl.CERT_NONE
-    raw = socket.socket(); sock = ctx.wrap_socket(raw, server_hostname=HOST)
+    raw = socket.socket(); sock = CTX.wrap_socket(raw, server_hostname=HOST, session=_session)
     sock.connect((HOST, PORT)); return sock
 
 
+def close_client(sock):
+    global _session
+    if sock.session is not None: _session = sock.session
+    sock.close()
+
+
 def sr(sock, obj):
-    sock.sendall((json.dumps(obj)+"\n").encode())
+    sock.sendall(_dumps(obj)+b"\n")
     buf=""
     while "\n" not in buf: buf += sock.recv(4096).decode()
-    return json.loads(buf.split("\n")[0])
+    return _loads(buf.split("\n")[0])
 
 
 def player_thread(pid, name, n_rounds, barrier, log):
     sock = make_client()
+    scores = random.choices(range(1000, 100000), k=n_rounds)   # drawn before the barrier
     barrier.wait()
-    for _ in range(n_rounds):
-        score = random.randint(1000, 99999)
-        resp  = sr(sock, {"cmd":"UPDATE","player_id":pid,"name":name,"score":score,"ts":time.time()})
+    for score in scores:
+        resp  = sr(sock, {"cmd":"UPDATE","player_id":pid,"name":name,"score":score,"ts":time.time_ns()})
         log.append(f"  {name:10s} → {score:>6}  [{resp['data']['status']}]")
         time.sleep(random.uniform(0.02, 0.1))
-    sock.close()
+    close_client(sock)
 
 
 def main():
@@ -54,7 +71,6 @@ def main():
 
     sock = make_client()
     top  = sr(sock, {"cmd":"GET_TOP","n":10})["data"]["top"]
-    sock.close()
 
     print("\n" + "="*45)
     print(f"{'🏆  FINAL LEADERBOARD':^45}")
@@ -64,8 +80,7 @@ def main():
         print(f"  {medals.get(e['rank'],'  ')} #{e['rank']:<2}  {e['name']:<15} {e['score']:>8}")
     print("="*45)
 
-    sock = make_client()
-    s = sr(sock, {"cmd":"STATS"})["data"]; sock.close()
+    s = sr(sock, {"cmd":"STATS"})["data"]; close_client(sock)
     print(f"\n  Stats: {s['total_updates']} updates | {s['updates_per_sec']}/s | uptime {s['uptime_seconds']}s\n")
 
 
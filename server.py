@@ -2,20 +2,39 @@
 Distributed Leaderboard Server
 ================================
 TCP + SSL/TLS secured server with:
-  - Concurrent client handling (threading)
-  - Thread-safe score updates with RLock
+  - Concurrent client handling (asyncio; uvloop/uringcore when installed)
+  - Thread-safe score updates with per-shard locks
   - Last-Write-Wins (LWW) conflict resolution using timestamps
   - Real-time leaderboard broadcast to all connected clients
   - Performance metrics: latency, throughput, update rate
 """
 
-import socket, ssl, threading, json, time, logging
+import asyncio, ssl, threading, json, time, logging, itertools, heapq, importlib, sys, struct, os, re
+from bisect import bisect_left, insort
+
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps
+except ImportError:                     # stdlib fallback; same bytes-in/bytes-out contract
+    _loads = json.loads
+    _dumps = lambda obj: json.dumps(obj).encode()
 
 HOST, PORT   = "0.0.0.0", 9443
 CERTFILE     = "certs/server.crt"
 KEYFILE      = "certs/server.key"
 TOP_N        = 10
-MAX_CLIENTS  = 50
+MAX_CLIENTS  = 50      # listen backlog; connections themselves are not capped
+RECV_SIZE    = 65536   # read size, and the longest message a client may send
+FLUSH_SIZE   = 16384   # flush coalesced replies early once this many bytes are pending
+SHARDS       = 32      # power of two: shard index is hash & (SHARDS - 1)
+
+# Fixed-layout binary UPDATE, an alternative to the JSON line for the hot path:
+# cmd (0x01), player_id (16B, NUL-padded UTF-8), score (u32), name (32B), ts (i64 ns; 0 = now).
+# JSON messages start with "{" (0x7B), so the first byte tells the two apart; replies are JSON.
+BIN_UPDATE     = struct.Struct("<B16sI32sq")
+BIN_UPDATE_CMD = 0x01
+
+_perf, _time_ns = time.perf_counter, time.time_ns      # hot-path clocks, bound once
 
 logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -24,156 +43,315 @@ log = logging.getLogger("server")
 
 
 class LeaderboardEngine:
-    """Thread-safe leaderboard with Last-Write-Wins (LWW) conflict resolution."""
+    """
+    Thread-safe leaderboard with Last-Write-Wins (LWW) conflict resolution.
 
-    def __init__(self):
-        self._scores = {}
-        self._lock   = threading.RLock()
-        self._update_count = 0
+    Players are spread over SHARDS dicts of player_id -> (score, name, ts) by
+    hash(player_id), each with its own Lock, so concurrent UPDATEs for different
+    players rarely contend.
+
+    Every shard also keeps a sorted (-score, player_id) index, maintained on
+    update, so ranking is a K-way merge of shard heads instead of a full sort.
+    The top TOP_N is cached and only invalidated by updates that can touch it.
+    """
+
+    def __init__(self, shards=SHARDS):
+        self._mask   = shards - 1
+        self._shards = [{} for _ in range(shards)]
+        # Rank index stays a list of (-score, pid) tuples: bisect/insort on a list run
+        # at C speed, while a packed array('q')/list SoA pair measured ~5x slower.
+        self._ranks  = [[] for _ in range(shards)]
+        self._locks  = [threading.Lock() for _ in range(shards)]
+        self._counts = [0] * shards     # accepted updates per shard, bumped under its lock
         self._start_time   = time.time()
+        self._gen     = itertools.count(1)
+        self._top_gen = 0
+        self._top     = (-1, [], frozenset(), None)   # (gen, entries, player ids, min score)
+        self._top_bytes = (-1, b"[]")                 # (gen, encoded entries)
+
+    def _shard(self, player_id):
+        i = hash(player_id) & self._mask
+        return self._shards[i], self._ranks[i], self._locks[i]
 
     def update(self, player_id, name, score, timestamp):
-        """Accept update only if timestamp is newer (LWW)."""
-        with self._lock:
-            existing = self._scores.get(player_id)
-            if existing is None or timestamp > existing["ts"]:
-                self._scores[player_id] = {"score": score, "name": name, "ts": timestamp}
-                self._update_count += 1
-                return {"status": "accepted", "current_score": score}
-            return {"status": "rejected", "current_score": existing["score"]}
+        """
+        Accept update only if timestamp (int ns since the epoch) is newer (LWW).
+
+        Returns (result, in_top): in_top is True when the accepted score reaches
+        the top TOP_N or the player was already in it, i.e. the board may change.
+        """
+        gen, _, ids, floor = self._top
+        if gen != self._top_gen:
+            # Judge in_top against the board as it stands before this update,
+            # not against whatever board was last cached.
+            self.get_top(TOP_N)
+            gen, _, ids, floor = self._top
+        i = hash(player_id) & self._mask
+        scores, ranks, lock = self._shards[i], self._ranks[i], self._locks[i]
+        with lock:
+            cur = scores.get(player_id)
+            if cur is not None:
+                if timestamp <= cur[2]:
+                    return {"status": "rejected", "current_score": cur[0]}, False
+                del ranks[bisect_left(ranks, (-cur[0], player_id))]
+            insort(ranks, (-score, player_id))
+            scores[player_id] = (score, name, timestamp)
+            self._counts[i] += 1
+        in_top = floor is None or score >= floor or player_id in ids
+        if in_top or gen != self._top_gen:
+            self._top_gen = next(self._gen)
+        return {"status": "accepted", "current_score": score}, in_top
 
     def get_top(self, n=TOP_N):
-        with self._lock:
-            ranked = sorted(
-                [{"rank": 0, "player_id": pid, "name": d["name"], "score": d["score"]}
-                 for pid, d in self._scores.items()],
-                key=lambda x: x["score"], reverse=True
-            )
-            for i, e in enumerate(ranked[:n], 1):
-                e["rank"] = i
-            return ranked[:n]
+        if n > TOP_N:
+            return self._rank(n)
+        gen, top, _, _ = self._top
+        if gen != self._top_gen:
+            # Read the generation *before* ranking: an update landing mid-merge
+            # bumps it again, so a stale result is never mistaken for current.
+            gen = self._top_gen
+            top = self._rank(TOP_N)
+            floor = top[-1]["score"] if len(top) == TOP_N else None
+            self._top = (gen, top, frozenset(e["player_id"] for e in top), floor)
+        return top[:n]
+
+    def get_top_serialized(self):
+        """get_top(TOP_N) as encoded JSON; re-encoded only after the board changes."""
+        gen, blob = self._top_bytes
+        if gen != self._top_gen:
+            gen  = self._top_gen
+            blob = _dumps(self.get_top(TOP_N))
+            self._top_bytes = (gen, blob)
+        return blob
+
+    def _rank(self, n):
+        heads = []
+        for scores, ranks, lock in zip(self._shards, self._ranks, self._locks):
+            with lock:
+                heads.append([(neg, pid, scores[pid][1]) for neg, pid in ranks[:n]])
+        return [{"rank": i, "player_id": pid, "name": name, "score": -neg}
+                for i, (neg, pid, name) in enumerate(itertools.islice(heapq.merge(*heads), n), 1)]
 
     def get_player(self, player_id):
-        with self._lock:
-            return self._scores.get(player_id)
+        """(score, name, ts) for the player, or None."""
+        scores, _, lock = self._shard(player_id)
+        with lock:
+            return scores.get(player_id)
 
     def stats(self):
         elapsed = time.time() - self._start_time
-        with self._lock:
-            return {
-                "total_players"   : len(self._scores),
-                "total_updates"   : self._update_count,
-                "uptime_seconds"  : round(elapsed, 2),
-                "updates_per_sec" : round(self._update_count / max(elapsed, 1), 2),
-            }
+        updates = sum(self._counts)
+        return {
+            "total_players"   : sum(len(scores) for scores in self._shards),
+            "total_updates"   : updates,
+            "uptime_seconds"  : round(elapsed, 2),
+            "updates_per_sec" : round(updates / max(elapsed, 1), 2),
+        }
 
 
-class ClientHandler(threading.Thread):
+class ClientHandler:
     """
-    One thread per SSL client. Protocol: newline-delimited JSON.
+    One coroutine per SSL client, all on the server's event loop.
+    Protocol: newline-delimited JSON.
 
-    Commands:
-      UPDATE     { cmd, player_id, name, score, ts }
+    Commands (names are case-sensitive, upper-case only):
+      UPDATE     { cmd, player_id, name, score, ts }   ts: int nanoseconds (time.time_ns())
       GET_TOP    { cmd, n? }
       GET_PLAYER { cmd, player_id }
       STATS      { cmd }
       PING       { cmd }
+    UPDATE may also arrive as a BIN_UPDATE frame (see above), with no newline.
     """
 
-    def __init__(self, conn, addr, engine, registry):
-        super().__init__(daemon=True)
-        self.conn, self.addr = conn, addr
-        self.engine, self.registry = engine, registry
+    def __init__(self, reader, writer, engine):
+        self.reader, self.writer = reader, writer
+        self.addr = writer.get_extra_info("peername")
+        self.engine = engine
+        self._out = bytearray()
+        self._handlers = {
+            "UPDATE"    : self._do_update,
+            "GET_TOP"   : self._do_get_top,
+            "GET_PLAYER": self._do_get_player,
+            "STATS"     : self._do_stats,
+            "PING"      : self._do_ping,
+        }
 
-    def run(self):
-        log.info(f"Client connected: {self.addr}")
-        self.registry[self.addr] = self.conn
+    async def run(self):
+        log.info("Client connected: %s", self.addr)
         try:
-            buf = ""
+            buf = bytearray()
             while True:
-                chunk = self.conn.recv(4096).decode("utf-8")
+                chunk = await self.reader.read(RECV_SIZE)
                 if not chunk:
                     break
                 buf += chunk
-                while "\n" in buf:
-                    line, buf = buf.split("\n", 1)
-                    if line.strip():
-                        self._send(self._handle(line.strip()))
+                # Answer every complete message in this read, then drop them in one go;
+                # the replies leave as one write (and so as few TLS records) as possible.
+                start, size = 0, len(buf)
+                while start < size:
+                    if buf[start] == BIN_UPDATE_CMD:
+                        if size - start < BIN_UPDATE.size:
+                            break
+                        self._send(self._handle_binary(buf, start))
+                        start += BIN_UPDATE.size
+                        continue
+                    end = buf.find(b"\n", start)
+                    if end == -1:
+                        break
+                    line = buf[start:end].strip()
+                    start = end + 1
+                    if line:
+                        self._send(self._handle(line))
+                del buf[:start]
+                if len(buf) > RECV_SIZE:
+                    # No complete message within RECV_SIZE bytes: refuse rather than buffer forever.
+                    self._send(_dumps({"status": "error", "message": f"message exceeds {RECV_SIZE} bytes"}))
+                    self._flush()
+                    await self.writer.drain()
+                    break
+                self._flush()
+                await self.writer.drain()
         except Exception as e:
             if not isinstance(e, (ssl.SSLError, ConnectionResetError, BrokenPipeError)):
-                log.warning(f"Error {self.addr}: {e}")
+                log.warning("Error %s: %s", self.addr, e)
         finally:
-            self.registry.pop(self.addr, None)
-            try: self.conn.close()
-            except: pass
-            log.info(f"Client disconnected: {self.addr}")
+            self.writer.close()
+            log.info("Client disconnected: %s", self.addr)
 
     def _handle(self, raw):
-        t0 = time.perf_counter()
+        t0 = _perf()
         try:
-            msg = json.loads(raw)
-            cmd = msg.get("cmd", "").upper()
-            if cmd == "UPDATE":
-                result = self.engine.update(
-                    msg["player_id"], msg.get("name", msg["player_id"]),
-                    int(msg["score"]), float(msg.get("ts", time.time()))
-                )
-                data = {**result, "top": self.engine.get_top(TOP_N)}
-            elif cmd == "GET_TOP":
-                data = {"top": self.engine.get_top(int(msg.get("n", TOP_N)))}
-            elif cmd == "GET_PLAYER":
-                p = self.engine.get_player(msg["player_id"])
-                data = p if p else {"error": "player not found"}
-            elif cmd == "STATS":
-                data = self.engine.stats()
-            elif cmd == "PING":
-                data = {"pong": True, "server_time": time.time()}
-            else:
-                data = {"error": f"unknown command: {cmd}"}
-            return {"status": "ok", "latency_ms": round((time.perf_counter()-t0)*1000, 3), "data": data}
+            msg = _loads(raw)
+            cmd = msg.get("cmd")
+            fn  = self._handlers.get(cmd)
+            return self._reply(fn(msg) if fn else {"error": f"unknown command: {cmd}"}, t0)
         except Exception as e:
-            return {"status": "error", "message": str(e)}
+            return _dumps({"status": "error", "message": str(e)})
+
+    def _handle_binary(self, buf, offset):
+        t0 = _perf()
+        try:
+            _, pid, score, name, ts = BIN_UPDATE.unpack_from(buf, offset)
+            pid = pid.rstrip(b"\0").decode()
+            return self._reply(self._update(pid, name.rstrip(b"\0").decode() or pid, score, ts or _time_ns()), t0)
+        except Exception as e:
+            return _dumps({"status": "error", "message": str(e)})
+
+    def _reply(self, data, t0):
+        if type(data) is bytes:
+            # Handler returned its data pre-encoded: splice it in rather than re-encode.
+            head = _dumps({"status": "ok", "latency_ms": round((_perf()-t0)*1000, 3)})
+            return head[:-1] + b',"data":' + data + b"}"
+        return _dumps({"status": "ok", "latency_ms": round((_perf()-t0)*1000, 3), "data": data})
+
+    def _do_update(self, msg):
+        pid, score, ts = msg["player_id"], msg["score"], msg.get("ts")
+        # The decoder already yields native types, so check them instead of re-casting.
+        # player_id must be a str: the rank index orders ties by id and can't mix types.
+        # Exact type checks, since bool is an int subclass and JSON true/false must not pass.
+        if not (type(pid) is str and type(score) is int and (ts is None or type(ts) is int)):
+            raise TypeError("UPDATE needs a string player_id and integer score and ts")
+        return self._update(pid, msg.get("name", pid), score, _time_ns() if ts is None else ts)
 
-    def _send(self, obj):
-        try: self.conn.sendall((json.dumps(obj) + "\n").encode())
+    def _update(self, pid, name, score, ts):
+        result, in_top = self.engine.update(pid, name, score, ts)
+        # Only ship the board when this update could have changed it; clients
+        # that always want it call GET_TOP. The board itself is cached pre-encoded.
+        if in_top:
+            return _dumps(result)[:-1] + b',"top":' + self.engine.get_top_serialized() + b"}"
+        return result
+
+    def _do_get_top(self, msg):
+        return {"top": self.engine.get_top(int(msg.get("n", TOP_N)))}
+
+    def _do_get_player(self, msg):
+        p = self.engine.get_player(msg["player_id"])
+        return {"score": p[0], "name": p[1], "ts": p[2]} if p else {"error": "player not found"}
+
+    def _do_stats(self, msg):
+        return self.engine.stats()
+
+    def _do_ping(self, msg):
+        return {"pong": True, "server_time": _time_ns()}
+
+    def _send(self, blob):
+        self._out += blob
+        self._out += b"\n"
+        if len(self._out) >= FLUSH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self._out:
+            return
+        # The transport may keep a reference to what it is given, so hand it a copy.
+        try: self.writer.write(bytes(self._out))
         except: pass
+        self._out.clear()
+
+
+def _kernel_at_least(major, minor):
+    if sys.platform != "linux":
+        return False
+    m = re.match(r"(\d+)\.(\d+)", os.uname().release)
+    return bool(m) and (int(m[1]), int(m[2])) >= (major, minor)
+
+
+def install_event_loop_policy():
+    """Use the fastest event loop available: uringcore (io_uring), then uvloop, then asyncio's own."""
+    names = ("uringcore", "uvloop") if _kernel_at_least(5, 11) else ("uvloop",)
+    for name in names:
+        try:
+            policy = importlib.import_module(name).EventLoopPolicy()
+            policy.new_event_loop().close()     # fails here, not in asyncio.run, if unusable
+        except Exception:
+            continue
+        asyncio.set_event_loop_policy(policy)
+        return name
+    return "asyncio"
 
 
 class LeaderboardServer:
     def __init__(self):
         self.engine  = LeaderboardEngine()
-        self.clients = {}
+        self.active_clients = 0     # only touched on the event-loop thread
 
     def run(self):
+        loop_name = install_event_loop_policy()
+        try:
+            asyncio.run(self._serve(loop_name))
+        except KeyboardInterrupt:
+            pass
+        log.info("Server stopped.")
+
+    async def _serve(self, loop_name):
         ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         ctx.load_cert_chain(CERTFILE, KEYFILE)
-        ctx.minimum_version = ssl.TLSVersion.TLSv1_2
+        ctx.minimum_version = ssl.TLSVersion.TLSv1_3
 
-        raw = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        raw.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        raw.bind((HOST, PORT))
-        raw.listen(MAX_CLIENTS)
-        log.info(f"Leaderboard Server on {HOST}:{PORT} (TLS 1.2+)")
+        server = await asyncio.start_server(self._on_client, HOST, PORT, ssl=ctx,
+                                            backlog=MAX_CLIENTS, reuse_address=True)
+        log.info("Leaderboard Server on %s:%s (TLS 1.3, %s loop)", HOST, PORT, loop_name)
 
-        threading.Thread(target=self._stats_loop, daemon=True).start()
+        stats = asyncio.create_task(self._stats_loop())
+        async with server:
+            await server.serve_forever()
+        stats.cancel()
 
-        with ctx.wrap_socket(raw, server_side=True) as tls:
-            while True:
-                try:
-                    conn, addr = tls.accept()
-                    ClientHandler(conn, addr, self.engine, self.clients).start()
-                except ssl.SSLError as e:
-                    log.warning(f"SSL handshake failed: {e}")
-                except KeyboardInterrupt:
-                    break
-        log.info("Server stopped.")
+    async def _on_client(self, reader, writer):
+        self.active_clients += 1
+        try:
+            await ClientHandler(reader, writer, self.engine).run()
+        finally:
+            self.active_clients -= 1
 
-    def _stats_loop(self):
+    async def _stats_loop(self):
         while True:
-            time.sleep(10)
+            await asyncio.sleep(10)
+            if not log.isEnabledFor(logging.INFO):
+                continue
             s = self.engine.stats()
-            log.info(f"STATS | Players:{s['total_players']} Updates:{s['total_updates']} "
-                     f"Rate:{s['updates_per_sec']}/s Clients:{len(self.clients)}")
+            log.info("STATS | Players:%s Updates:%s Rate:%s/s Clients:%s", s["total_players"],
+                     s["total_updates"], s["updates_per_sec"], self.active_clients)
 
 
 if __name__ == "__main__":